@@ -17,13 +17,21 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-from typing import NamedTuple, Tuple
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from collections import OrderedDict
 import sys
 import ast
-import argparse
 import contextlib
+import numpy as np
 with contextlib.redirect_stdout(None):  # Hides pygame welcome message
     import pygame
+try:  # orjson is optional, but parses considerably faster
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Only pygame-ce has the faster Surface.fblits
+_HAS_FBLITS = hasattr(pygame.Surface, 'fblits')
 
 
 # Configuration constants
@@ -31,29 +39,26 @@ INITIAL_WINDOW_WIDTH = 800
 INITIAL_WINDOW_HEIGHT = 200
 
 
-def main():
-    cli = argparse.ArgumentParser(
-        prog='visualize.py',
-        description='Traffic Simulation Visualizer',
-    )
+USAGE = 'usage: visualize.py [-h] [-s SPEED] [--dark]'
+HELP = f'''{USAGE}
 
-    def speed(s: str):
-        """Parse a valid speed int from a string."""
-        speed = int(s)
-        if speed < 1: raise argparse.ArgumentTypeError("speed must be >= 1")
-        return speed
+Traffic Simulation Visualizer
 
-    cli.add_argument(
-        '-s', '--speed', type=speed, default=4,
-        help='set the playback rate to the given factor (>= 1)',
-    )
+optional arguments:
+  -h, --help            show this help message and exit
+  -s SPEED, --speed SPEED
+                        set the playback rate to the given factor (>= 1)
+  --dark                use dark mode
+'''
 
-    cli.add_argument(
-        '--dark', action='store_true',
-        help='use dark mode',
-    )
 
-    args = cli.parse_args()
+class Arguments(NamedTuple):
+    speed: int = 4
+    dark: bool = False
+
+
+def main():
+    args = parse_args(sys.argv[1:])
 
     visualizer = Visualizer(INITIAL_WINDOW_WIDTH, INITIAL_WINDOW_HEIGHT)
     visualizer.set_playback_rate(args.speed)
@@ -61,74 +66,150 @@ def main():
     if args.dark:
         # You can adjust these colors to get a custom theme
         visualizer.set_colors(Visualizer.Colors(
-            background = Color(0, 0, 0),
-            text = Color(255, 255, 255),
-            road = Color(55, 55, 55),
-            car = Color(215, 215, 215),
-            generator = Color(140, 0, 140),
-            deceleration_range = Color(55, 75, 113),
-            stopping_range_full = Color(119, 25, 25),
-            stopping_range_half = Color(113, 73, 0),
+            background = rgb(0, 0, 0),
+            text = rgb(255, 255, 255),
+            road = rgb(55, 55, 55),
+            car = rgb(215, 215, 215),
+            generator = rgb(140, 0, 140),
+            deceleration_range = rgb(55, 75, 113),
+            stopping_range_full = rgb(119, 25, 25),
+            stopping_range_half = rgb(113, 73, 0),
         ))
 
-    for line in sys.stdin.readlines():
-        visualizer.push_simulation_frame_data(line)
+    visualizer.push_simulation_data(sys.stdin.read())
 
     visualizer.main_loop()
 
 
-class Color:
-    def __init__(self, red: int, green: int, blue: int):
-        assert 0 <= red <= 255
-        assert 0 <= green <= 255
-        assert 0 <= blue <= 255
-        self._red = red
-        self._green = green
-        self._blue = blue
+def parse_args(argv: List[str]) -> Arguments:
+    """Parse the command line arguments, exiting on errors or --help.
+
+    This replaces argparse, which is slow to import compared to the time the
+    visualizer needs to start up.
+    """
+    def error(message: str):
+        print(USAGE, file=sys.stderr)
+        print(f'visualize.py: error: {message}', file=sys.stderr)
+        sys.exit(2)
 
-    def as_tuple(self) -> Tuple[int, int, int]:
-        return self._red, self._green, self._blue
+    def speed(s: str) -> int:
+        """Parse a valid speed int from a string."""
+        try:
+            speed = int(s)
+        except ValueError:
+            error(f"argument -s/--speed: invalid speed value: '{s}'")
+        if speed < 1: error("argument -s/--speed: speed must be >= 1")
+        return speed
+
+    args = Arguments()
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        i += 1
+        if arg in ('-h', '--help'):
+            print(HELP, end='')
+            sys.exit(0)
+        elif arg == '--dark':
+            args = args._replace(dark=True)
+        elif arg in ('-s', '--speed'):
+            if i == len(argv):
+                error('argument -s/--speed: expected one argument')
+            args = args._replace(speed=speed(argv[i]))
+            i += 1
+        elif arg.startswith('--speed='):
+            args = args._replace(speed=speed(arg[len('--speed='):]))
+        elif arg.startswith('-s'):
+            args = args._replace(speed=speed(arg[len('-s'):]))
+        else:
+            error(f'unrecognized arguments: {arg}')
+    return args
 
-    def get_red(self) -> int:
-        return self._red
 
-    def set_red(self, red: int):
-        assert 0 <= red <= 255
-        self._red = red
+Color = Tuple[int, int, int]
 
-    def get_green(self) -> int:
-        return self._green
 
-    def set_green(self, green: int):
-        assert 0 <= green <= 255
-        self._green = green
+def rgb(red: int, green: int, blue: int) -> Color:
+    """Create a color from its red, green and blue components."""
+    assert 0 <= red <= 255
+    assert 0 <= green <= 255
+    assert 0 <= blue <= 255
+    return red, green, blue
 
-    def get_blue(self) -> int:
-        return self._blue
 
-    def set_blue(self, blue: int):
-        assert 0 <= blue <= 255
-        self._blue = blue
+def car_blit_sequence(
+    cars_x, cars_type, car_surfaces: Dict[str, 'pygame.Surface'],
+    create_car_surface, car_y: int
+):
+    """Get the (surface, position) pairs to blit the cars of a road.
+
+    Car surfaces missing from car_surfaces are created with
+    create_car_surface and added to it.
+    """
+    get_car_surface = car_surfaces.get
+    blit_sequence = []
+    append_blit = blit_sequence.append
+    for car_x, car_type in zip(cars_x.tolist(), cars_type):
+        car_surface = get_car_surface(car_type)
+        if car_surface is None:
+            car_surface = create_car_surface(car_type)
+            car_surfaces[car_type] = car_surface
+        append_blit((car_surface, (car_x, car_y)))
+    return blit_sequence
+
+
+try:  # Use the compiled version if it was built, see visualize_fast.pyx
+    from visualize_fast import car_blit_sequence
+except ImportError:
+    pass
 
 
 class Visualizer:
     class Colors(NamedTuple):
-        background: Color = Color(255, 255, 255)
-        text: Color = Color(0, 0, 0)
-        road: Color = Color(200, 200, 200)
-        car: Color = Color(40, 40, 40)
-        bus: Color = Color(0, 200, 0)
-        firetruck: Color = Color(255, 0, 0)
-        ambulance: Color = Color(150, 0, 0)
-        police_cruiser: Color = Color(0, 0, 255)
-        traffic_light_green: Color = Color(0, 255, 0)
-        traffic_light_red: Color = Color(255, 0, 0)
-        generator: Color = Color(255, 100, 255)
-        deceleration_range: Color = Color(155, 175, 213)
-        stopping_range_full: Color = Color(219, 125, 125)
-        stopping_range_half: Color = Color(213, 173, 99)
+        background: Color = rgb(255, 255, 255)
+        text: Color = rgb(0, 0, 0)
+        road: Color = rgb(200, 200, 200)
+        car: Color = rgb(40, 40, 40)
+        bus: Color = rgb(0, 200, 0)
+        firetruck: Color = rgb(255, 0, 0)
+        ambulance: Color = rgb(150, 0, 0)
+        police_cruiser: Color = rgb(0, 0, 255)
+        traffic_light_green: Color = rgb(0, 255, 0)
+        traffic_light_red: Color = rgb(255, 0, 0)
+        generator: Color = rgb(255, 100, 255)
+        deceleration_range: Color = rgb(155, 175, 213)
+        stopping_range_full: Color = rgb(219, 125, 125)
+        stopping_range_half: Color = rgb(213, 173, 99)
+
+    class _Road(NamedTuple):
+        name: str
+        length: int
+        # Slices of the flat car and traffic light arrays of the timeline
+        cars: slice
+        lights: slice
+        cars_type: List[str]
+        lights_green: List[bool]
+
+    class _Situation(NamedTuple):
+        time: float
+        roads: List['Visualizer._Road']
+        # Identifies what the static layer of the situation looks like
+        layout: Tuple[Tuple[str, int], ...]
+
+    class _TimelinePixels(NamedTuple):
+        cars_x: np.ndarray
+        lights_x: np.ndarray
+        deceleration_distances: np.ndarray
+        stopping_distances: np.ndarray
+
+    class _RoadPixels(NamedTuple):
+        cars_x: np.ndarray
+        lights_x: List[int]
+        indicators: List[Tuple[int, int, int]]
 
     _FPS: int = 60
+    _DISPLAY_FLAGS: int = pygame.RESIZABLE | pygame.DOUBLEBUF | pygame.HWSURFACE
+    _KEY_REPEAT_DELAY: int = 200
+    _KEY_REPEAT_INTERVAL: int = 1000 // _FPS
     _DEFAULT_PLAYBACK_RATE: int = 1
     _DEFAULT_WINDOW_TITLE: str = 'Traffic Simulation Visualizer'
     _DEFAULT_CANVAS_MARGIN: int = 16
@@ -143,6 +224,8 @@ class Visualizer:
     _DEFAULT_PAUSE_ICON_HEIGHT: int = 20
     _DEFAULT_FONT_FAMILY: str = 'DejaVu Sans'
     _DEFAULT_FONT_SIZE: int = 16
+    _TIME_TEXT_CACHE_SIZE: int = 256
+    _FRAME_CACHE_SIZE_BYTES: int = 128 * 1024 * 1024
 
     def __init__(self, initial_window_width: int, initial_window_height: int):
         self._fps: int = Visualizer._FPS
@@ -164,13 +247,55 @@ class Visualizer:
         self._pause_icon_width: int = Visualizer._DEFAULT_PAUSE_ICON_WIDTH
         self._pause_icon_height: int = Visualizer._DEFAULT_PAUSE_ICON_HEIGHT
         self._playback_rate: int = Visualizer._DEFAULT_PLAYBACK_RATE
-        self._timeline = []
+        self._pending_frames = []
+        # The timeline is stored as flat arrays of all cars and traffic
+        # lights.  The cars and lights of road r are the ranges from
+        # car_offsets[r] and light_offsets[r] up to the offsets at r+1,
+        # and the roads of frame t range over road_offsets[t:t+2].
+        self._times: List[float] = []
+        self._layouts: List[Tuple[Tuple[str, int], ...]] = []
+        self._road_offsets: np.ndarray = np.zeros(1, dtype=np.int64)
+        self._car_offsets: np.ndarray = np.zeros(1, dtype=np.int64)
+        self._light_offsets: np.ndarray = np.zeros(1, dtype=np.int64)
+        self._cars_x: np.ndarray = np.zeros(0, dtype=np.float64)
+        self._cars_type: List[str] = []
+        self._lights_x: np.ndarray = np.zeros(0, dtype=np.int32)
+        self._lights_green: np.ndarray = np.zeros(0, dtype=bool)
+        self._lights_indicated: np.ndarray = np.zeros(0, dtype=bool)
+        self._lights_xs: np.ndarray = np.zeros(0, dtype=np.int32)
+        self._lights_xs0: np.ndarray = np.zeros(0, dtype=np.int32)
+        self._max_road_length: int = 0
         self._time_idx: int = 0
+        self._frame_accumulator: float = 0.0
         self._paused: bool = False
+        self._keys_held: Set[int] = set()
+        self._car_surfaces: Dict[str, pygame.Surface] = {}
+        self._car_surfaces_width: int = 0
+        self._font: Optional[pygame.font.Font] = None
+        self._road_name_font: Optional[pygame.font.Font] = None
+        self._time_text_cache: 'OrderedDict[float, pygame.Surface]' = \
+            OrderedDict()
+        self._static_layer: Optional[pygame.Surface] = None
+        self._static_layer_key = None
+        self._pixels: Optional[Visualizer._TimelinePixels] = None
+        self._pixels_scale: float = 0.0
+        self._frame_cache: 'OrderedDict[int, pygame.Surface]' = OrderedDict()
+        self._frame_cache_window_size: Tuple[int, int] = (0, 0)
 
     def push_simulation_frame_data(self, data: str):
-        parsed_data = ast.literal_eval(data)
-        self._timeline.append(parsed_data)
+        parsed_data = Visualizer._parse_frame_data(data)
+        self._pending_frames.append(parsed_data)
+
+    def push_simulation_data(self, data: str):
+        """Push multiple frames at once, one frame per line."""
+        lines = [line for line in data.splitlines() if line.strip()]
+        try:
+            # Parsing all frames as a single JSON array is much cheaper than
+            # parsing them one by one
+            parsed_data = json_loads('[' + ','.join(lines) + ']')
+        except ValueError:
+            parsed_data = [Visualizer._parse_frame_data(l) for l in lines]
+        self._pending_frames.extend(parsed_data)
 
     def set_playback_rate(self, rate: int):
         assert rate >= 1
@@ -178,85 +303,338 @@ class Visualizer:
 
     def set_colors(self, colors: 'Visualizer.Colors'):
         self._colors = colors
+        self._car_surfaces = {}
+        self._time_text_cache.clear()
+        self._static_layer = None
+        self._frame_cache.clear()
+
+    def set_font_size(self, size: int):
+        assert size >= 1
+        self._font_size = size
+        self._font = None
+        self._road_name_font = None
+        self._time_text_cache.clear()
+        self._static_layer = None
+        self._frame_cache.clear()
 
     def main_loop(self):
+        self._pack_timeline()
         self._time_idx = 0
+        self._frame_accumulator = 0.0
 
         pygame.init()
         fps_clock = pygame.time.Clock()
         window = pygame.display.set_mode(
-            (self._window_width, self._window_height), pygame.RESIZABLE)
+            (self._window_width, self._window_height),
+            Visualizer._DISPLAY_FLAGS
+        )
         pygame.display.set_caption(self._window_title)
-
+        pygame.key.set_repeat(
+            Visualizer._KEY_REPEAT_DELAY, Visualizer._KEY_REPEAT_INTERVAL)
+
+        # The loop runs at the full FPS, so look up everything it uses once
+        get_events = pygame.event.get
+        update_display = pygame.display.update
+        tick = fps_clock.tick
+        fps = self._fps
+        get_frame = self._get_frame
+        advance_playback = self._advance_playback
+        keys_held = self._keys_held
+
+        elapsed_ms = 0
+        last_render_key = None
         while True:
-            for event in pygame.event.get() :
-                if event.type == pygame.QUIT:
+            events = get_events()
+            for event in events:
+                event_type = event.type
+                if event_type == pygame.QUIT:
                     pygame.quit()
                     return
-                elif event.type == pygame.VIDEORESIZE:
+                elif event_type == pygame.VIDEORESIZE:
                     self._window_width, self._window_height = event.size
-                elif event.type == pygame.KEYDOWN:
-                    self._handle_key_down(event.key)
-
-            keys_pressed = pygame.key.get_pressed()
-            if keys_pressed:
-                self._handle_keys_pressed(keys_pressed)
-
-            situation = self._timeline[self._time_idx]
-            if not self._paused:
-                self._frames_forward(self._playback_rate)
-
-            self._render_situation(window, situation)
-
-            pygame.display.update()
-
-            fps_clock.tick(self._fps)
+                elif event_type == pygame.KEYDOWN:
+                    self._handle_key_down(event.key, event.mod)
+                elif event_type == pygame.KEYUP:
+                    keys_held.discard(event.key)
+                elif event_type == pygame.WINDOWFOCUSLOST:
+                    keys_held.clear()
+
+            paused = self._paused
+            if not paused:
+                advance_playback(elapsed_ms)
+                paused = self._paused
+
+            # Don't redraw the same frame over and over again while paused
+            time_idx = self._time_idx
+            render_key = (
+                time_idx, paused, self._window_width, self._window_height)
+            if events or render_key != last_render_key:
+                window.blit(get_frame(time_idx), (0, 0))
+                if paused:
+                    self._draw_pause_icon(window)
+                update_display()
+                last_render_key = render_key
+
+            elapsed_ms = tick(fps)
+
+    def _advance_playback(self, elapsed_ms: int):
+        """Advance the timeline by the frames due in the elapsed time.
+
+        Playback advances by the playback rate for every 1/FPS seconds of real
+        time. When rendering can't keep up with the FPS, frames are skipped
+        instead of slowing down the playback.
+        """
+        self._frame_accumulator += \
+            elapsed_ms * self._fps * self._playback_rate / 1000
+        frames = int(self._frame_accumulator)
+        self._frame_accumulator -= frames
+        self._frames_forward(frames)
+
+    @staticmethod
+    def _parse_frame_data(data: str):
+        """Parse a frame as JSON, falling back to a Python literal."""
+        data = data.strip()
+        if data[:1] in ('{', '['):
+            try:
+                return json_loads(data)
+            except ValueError:
+                pass  # Legacy input, e.g. single-quoted strings
+        return ast.literal_eval(data)
+
+    def _pack_timeline(self):
+        """Append the pending frames to the flat timeline arrays."""
+        frames = self._pending_frames
+        if not frames:
+            return
+        self._pending_frames = []
+
+        for frame in frames:
+            layout = tuple(
+                (road['name'], int(road['length'])) for road in frame['roads'])
+            if self._layouts and layout == self._layouts[-1]:
+                layout = self._layouts[-1]  # Share the same object
+            self._layouts.append(layout)
+            self._times.append(frame['time'])
+            # The roads of all frames share a single horizontal scale
+            self._max_road_length = max(
+                self._max_road_length,
+                max((length for _, length in layout), default=0)
+            )
 
-    def _handle_key_down(self, key):
-        if key == pygame.K_SPACE:
+        roads = [road for frame in frames for road in frame['roads']]
+        cars = [car for road in roads for car in road['cars']]
+        lights = [light for road in roads for light in road['lights']]
+
+        self._road_offsets = Visualizer._extend_offsets(
+            self._road_offsets, [len(frame['roads']) for frame in frames])
+        self._car_offsets = Visualizer._extend_offsets(
+            self._car_offsets, [len(road['cars']) for road in roads])
+        self._light_offsets = Visualizer._extend_offsets(
+            self._light_offsets, [len(road['lights']) for road in roads])
+
+        self._cars_x = np.concatenate((self._cars_x, np.array(
+            [car['x'] for car in cars], dtype=np.float64)))
+        self._cars_type.extend(car.get('type', 'car') for car in cars)
+
+        lights_green = np.array(
+            [bool(light['green']) for light in lights], dtype=bool)
+        # Only red lights with both ranges given show their indicators
+        lights_indicated = ~lights_green & np.array(
+            ['xs' in light and 'xs0' in light for light in lights],
+            dtype=bool)
+        self._lights_x = np.concatenate((self._lights_x, np.array(
+            [int(light['x']) for light in lights], dtype=np.int32)))
+        self._lights_green = np.concatenate(
+            (self._lights_green, lights_green))
+        self._lights_indicated = np.concatenate(
+            (self._lights_indicated, lights_indicated))
+        self._lights_xs = np.concatenate((self._lights_xs, np.array(
+            [int(light.get('xs', 0)) for light in lights], dtype=np.int32)))
+        self._lights_xs0 = np.concatenate((self._lights_xs0, np.array(
+            [int(light.get('xs0', 0)) for light in lights], dtype=np.int32)))
+
+        self._pixels = None
+        self._frame_cache.clear()
+
+    @staticmethod
+    def _extend_offsets(offsets: np.ndarray, counts: List[int]) -> np.ndarray:
+        new_offsets = offsets[-1] + np.cumsum(np.array(counts, dtype=np.int64))
+        return np.concatenate((offsets, new_offsets))
+
+    def _get_frame_count(self) -> int:
+        return len(self._times)
+
+    def _get_situation(self, time_idx: int) -> 'Visualizer._Situation':
+        layout = self._layouts[time_idx]
+        road_start, road_end = self._road_offsets[time_idx:time_idx+2].tolist()
+        car_offsets = self._car_offsets[road_start:road_end+1].tolist()
+        light_offsets = self._light_offsets[road_start:road_end+1].tolist()
+        roads = []
+        for i, (name, length) in enumerate(layout):
+            cars = slice(car_offsets[i], car_offsets[i+1])
+            lights = slice(light_offsets[i], light_offsets[i+1])
+            roads.append(Visualizer._Road(
+                name, length, cars, lights, self._cars_type[cars],
+                self._lights_green[lights].tolist()
+            ))
+        return Visualizer._Situation(self._times[time_idx], roads, layout)
+
+    def _handle_key_down(self, key, mod):
+        # Holding down a key repeats its KEYDOWN event, which should only
+        # step through the frames
+        repeated = key in self._keys_held
+        self._keys_held.add(key)
+        shift_pressed = mod & pygame.KMOD_SHIFT
+        if key == pygame.K_SPACE and not repeated:
             self._toggle_pause()
-        if key == pygame.K_r:
+        if key == pygame.K_r and not repeated:
             self._time_idx = 0
-
-    def _handle_keys_pressed(self, keys_pressed):
-        shift_pressed = keys_pressed[pygame.K_LSHIFT] or keys_pressed[pygame.K_RSHIFT]
-        if keys_pressed[pygame.K_LEFT]:
+        if key == pygame.K_LEFT:
             if self._paused:
                 self._frames_back(self._playback_rate if shift_pressed else 1)
-        if keys_pressed[pygame.K_RIGHT]:
+        if key == pygame.K_RIGHT:
             if self._paused:
                 self._frames_forward(self._playback_rate if shift_pressed else 1)
 
     def _toggle_pause(self):
         self._paused = not self._paused
+        self._frame_accumulator = 0.0
 
     def _frames_back(self, n):
         self._time_idx = max(0, self._time_idx - n)
 
     def _frames_forward(self, n):
         self._time_idx = self._time_idx + n
-        if self._time_idx >= len(self._timeline):
+        if self._time_idx >= self._get_frame_count():
             self._paused = True
-            self._time_idx = len(self._timeline) - 1
-
-    def _render_situation(self, window, situation):
-        self._draw_background(window)
-        self._draw_time(window, situation['time'])
-        if self._paused:
-            self._draw_pause_icon(window)
-
-        roads = situation['roads']
-
-        max_road_length = max(int(road['length']) for road in roads)
-        horizontal_scale = self._get_canvas_width() / max_road_length
+            self._time_idx = self._get_frame_count() - 1
+
+    def _get_frame(self, time_idx: int) -> pygame.Surface:
+        """Get the rendered situation at the given time index.
+
+        The most recently shown frames are kept in an LRU cache, limited by
+        their total size in memory, so stepping back and forth through them
+        doesn't render them again.  Resizing the window clears the cache.
+        """
+        size = (self._window_width, self._window_height)
+        if size != self._frame_cache_window_size:
+            self._frame_cache.clear()
+            self._frame_cache_window_size = size
+        frame = self._frame_cache.get(time_idx)
+        if frame is not None:
+            self._frame_cache.move_to_end(time_idx)
+            return frame
+        max_frames = Visualizer._FRAME_CACHE_SIZE_BYTES \
+            // (4 * self._window_width * self._window_height)
+        if self._frame_cache and len(self._frame_cache) >= max_frames:
+            # Reuse the surface of the least recently shown frame
+            _, frame = self._frame_cache.popitem(last=False)
+        else:
+            frame = pygame.Surface(size).convert()
+        self._render_situation(frame, time_idx)
+        self._frame_cache[time_idx] = frame
+        return frame
+
+    def _render_situation(self, window, time_idx: int):
+        situation = self._get_situation(time_idx)
+        roads = situation.roads
+
+        horizontal_scale = self._get_canvas_width() / self._max_road_length
+        pixels = self._get_pixels(horizontal_scale)
+        roads_pixels = [
+            self._get_road_pixels(pixels, road) for road in roads]
+
+        roads_y = [self._get_road_y(i, len(roads)) for i in range(len(roads))]
+
+        static_layer = self._get_static_layer(
+            situation, roads_y, horizontal_scale)
+        window.blit(static_layer, (0, 0))
+        self._draw_time(window, situation.time)
+
+        # The indicators of all roads are drawn first, grouped by color
+        deceleration_rects = []
+        stopping_full_rects = []
+        stopping_half_rects = []
+        for road_pixels, road_y in zip(roads_pixels, roads_y):
+            self._collect_indicators(
+                road_pixels, road_y,
+                deceleration_rects, stopping_full_rects, stopping_half_rects
+            )
+        self._draw_indicators(
+            window, deceleration_rects, stopping_full_rects,
+            stopping_half_rects
+        )
 
-        for i, road in enumerate(roads):
-            road_y_offset = (i+1) * self._get_canvas_height() / (len(roads)+1)
-            road_y = self._get_canvas_origin_top() + int(road_y_offset)
-            self._draw_full_road(window, road, road_y, horizontal_scale)
+        for road, road_pixels, road_y in zip(roads, roads_pixels, roads_y):
+            self._draw_traffic_lights(
+                window, road, road_pixels, road_y, horizontal_scale)
+            self._draw_cars(window, road, road_pixels, road_y, horizontal_scale)
+
+    def _get_pixels(
+        self, horizontal_scale: float
+    ) -> 'Visualizer._TimelinePixels':
+        """Get the horizontal pixel positions of the whole timeline.
+
+        The positions are computed for all frames at once and reused until
+        the horizontal scale changes.
+        """
+        if self._pixels is None or horizontal_scale != self._pixels_scale:
+            origin_left = self._get_canvas_origin_left()
+            car_width = max(1, int(self._get_car_width() * horizontal_scale))
+            cars_x = origin_left - car_width \
+                + (self._cars_x * horizontal_scale).astype(np.int32)
+            lights_x = origin_left \
+                + (self._lights_x * horizontal_scale).astype(np.int32)
+            deceleration_distances = \
+                (self._lights_xs * horizontal_scale).astype(np.int32)
+            stopping_distances = \
+                (self._lights_xs0 * horizontal_scale).astype(np.int32)
+            self._pixels = Visualizer._TimelinePixels(
+                cars_x, lights_x, deceleration_distances, stopping_distances)
+            self._pixels_scale = horizontal_scale
+        return self._pixels
+
+    def _get_road_pixels(
+        self, pixels: 'Visualizer._TimelinePixels', road: 'Visualizer._Road'
+    ) -> 'Visualizer._RoadPixels':
+        lights_x = pixels.lights_x[road.lights]
+        indicated = self._lights_indicated[road.lights]
+        indicators = list(zip(
+            lights_x[indicated].tolist(),
+            pixels.deceleration_distances[road.lights][indicated].tolist(),
+            pixels.stopping_distances[road.lights][indicated].tolist(),
+        ))
+        return Visualizer._RoadPixels(
+            pixels.cars_x[road.cars], lights_x.tolist(), indicators)
+
+    def _get_static_layer(
+        self, situation, roads_y, horizontal_scale: float
+    ) -> pygame.Surface:
+        """Get the parts of the situation that don't change between frames.
+
+        The background, roads, road names and generators are drawn onto a
+        separate surface, which is reused until the window size or the
+        layout of the roads changes.
+        """
+        key = (
+            self._window_width, self._window_height, horizontal_scale,
+            situation.layout
+        )
+        if self._static_layer is None or key != self._static_layer_key:
+            # Prebuilt surfaces are converted to the pixel format of the
+            # display, so blitting them doesn't need to convert every pixel
+            static_layer = pygame.Surface(
+                (self._window_width, self._window_height)).convert()
+            self._draw_background(static_layer)
+            for road, road_y in zip(situation.roads, roads_y):
+                self._draw_static_road(
+                    static_layer, road, road_y, horizontal_scale)
+            self._static_layer = static_layer
+            self._static_layer_key = key
+        return self._static_layer
 
     def _draw_background(self, window):
-        window.fill(self._colors.background.as_tuple())
+        window.fill(self._colors.background)
 
     def _draw_pause_icon(self, window):
         width = self._pause_icon_width
@@ -265,69 +643,105 @@ class Visualizer:
             + self._get_canvas_width() - width
         origin_top = self._get_canvas_origin_top()
         pygame.draw.rect(
-            window, self._colors.text.as_tuple(), pygame.Rect(
+            window, self._colors.text, pygame.Rect(
                 origin_left, origin_top, width, height
             )
         )
         pygame.draw.rect(
-            window, self._colors.background.as_tuple(), pygame.Rect(
+            window, self._colors.background, pygame.Rect(
                 origin_left + width//3, origin_top, width - 2*width//3, height
             )
         )
 
-    def _draw_full_road(
+    def _draw_static_road(
         self, window, road, road_y: int, horizontal_scale: float
     ):
         road_x = self._get_canvas_origin_left()
-        road_width = int(int(road['length']) * horizontal_scale)
-        self._draw_road_name(window, road['name'], road_x, road_y)
+        road_width = int(road.length * horizontal_scale)
+        self._draw_road_name(window, road.name, road_x, road_y)
         self._draw_road(window, road_x, road_y, road_width)
-        self._draw_traffic_lights(
-            window, road['lights'], road_y, horizontal_scale)
-        self._draw_cars(window, road['cars'], road_y, horizontal_scale)
         self._draw_generator(window, road_x, road_y, horizontal_scale)
 
-    def _draw_cars(self, window, cars, road_y: int, horizontal_scale: float):
-        for car in cars:
-            car_width = max(1, int(self._get_car_width() * horizontal_scale))
-            car_x_offset = int(car['x'] * horizontal_scale) - car_width
-            car_x = self._get_canvas_origin_left() + int(car_x_offset)
-            if 'type' in car:
-                car_type = car['type']
-            else:
-                car_type = 'car'
-            self._draw_car(
-                window, car_x, road_y, car_width, car_type)
+    def _draw_cars(
+        self, window, road, road_pixels, road_y: int, horizontal_scale: float
+    ):
+        car_width = max(1, int(self._get_car_width() * horizontal_scale))
+        blit_sequence = car_blit_sequence(
+            road_pixels.cars_x, road.cars_type,
+            self._get_car_surfaces(car_width), self._create_car_surface,
+            road_y - self._get_car_height()//2
+        )
+        if _HAS_FBLITS:
+            window.fblits(blit_sequence)
+        else:
+            window.blits(blit_sequence, doreturn=False)
 
     def _draw_traffic_lights(
-        self, window, lights, road_y: int, horizontal_scale: float
+        self, window, road, road_pixels, road_y: int, horizontal_scale: float
     ):
-        for light in lights:
-            light_x_offset = int(light['x']) * horizontal_scale
-            light_x = self._get_canvas_origin_left() + int(light_x_offset)
-            stop_line_thickness = max(1,
-                int(self._get_light_stop_line_thickness()*horizontal_scale)
+        stop_line_thickness = max(1,
+            int(self._get_light_stop_line_thickness()*horizontal_scale)
+        )
+        green_color = self._colors.traffic_light_green
+        red_color = self._colors.traffic_light_red
+        road_height = self._get_road_height()
+        light_offset = self._get_light_offset()
+        radius = self._get_light_radius()
+        line_top_y = road_y - road_height//2
+        line_bottom_y = road_y + road_height//2 + light_offset
+        light_y = line_bottom_y + radius
+        draw_line = pygame.draw.line
+        draw_circle = pygame.draw.circle
+        lights = zip(road_pixels.lights_x, road.lights_green)
+        for light_x, is_green in lights:
+            color = green_color if is_green else red_color
+            draw_line(
+                window, color, (light_x, line_top_y), (light_x, line_bottom_y),
+                stop_line_thickness
             )
-            is_green = bool(light['green'])
-            if 'xs' in light and 'xs0' in light and not is_green:
-                deceleration_distance = int(light['xs']) * horizontal_scale
-                stopping_distance = int(light['xs0']) * horizontal_scale
-                self._draw_indicators(
-                    window, light_x, road_y,
-                    int(deceleration_distance), int(stopping_distance)
-                )
-            self._draw_traffic_light(
-                window, light_x, road_y, stop_line_thickness, is_green)
+            draw_circle(window, color, (light_x, light_y), radius)
+
+    def _collect_indicators(
+        self, road_pixels, road_y: int,
+        deceleration_rects, stopping_full_rects, stopping_half_rects
+    ):
+        """Append the indicator rects of the red lights of a road."""
+        road_height = self._get_road_height()
+        origin_y = road_y - road_height//2
+        indicators = road_pixels.indicators
+        for light_x, deceleration_distance, stopping_distance in indicators:
+            # The rects are drawn with Surface.fill, which doesn't clip rects
+            # starting left of the surface correctly, so clip them here
+            deceleration_x = max(0, light_x - deceleration_distance)
+            stopping_full_x = max(0, light_x - stopping_distance)
+            stopping_half_x = max(0, light_x - stopping_distance//2)
+            deceleration_rects.append((
+                deceleration_x, origin_y, light_x - deceleration_x, road_height
+            ))
+            stopping_full_rects.append((
+                stopping_full_x, origin_y, light_x - stopping_full_x,
+                road_height
+            ))
+            stopping_half_rects.append((
+                stopping_half_x, origin_y, light_x - stopping_half_x,
+                road_height
+            ))
 
     def _draw_time(self, window, time: float):
-        font = pygame.font.SysFont(self._font_family, self._get_font_size())
-        text = font.render(f'Time: {time}', True, self._colors.text.as_tuple())
+        text = self._time_text_cache.get(time)
+        if text is None:
+            text = self._get_font().render(
+                f'Time: {time}', True, self._colors.text).convert_alpha()
+            self._time_text_cache[time] = text
+            if len(self._time_text_cache) > Visualizer._TIME_TEXT_CACHE_SIZE:
+                self._time_text_cache.popitem(last=False)
+        else:
+            self._time_text_cache.move_to_end(time)
         window.blit(text, self._get_canvas_origin())
 
     def _draw_road_name(self, window, name: str, road_x: int, road_y: int):
-        font = pygame.font.SysFont(
-            self._font_family, int(.8*self._get_font_size()), italic=True)
-        text = font.render(name, True, self._colors.text.as_tuple())
+        font = self._get_road_name_font()
+        text = font.render(name, True, self._colors.text)
         origin_y = \
             road_y + self._get_road_height()//2 + self._get_road_name_offset()
         window.blit(text, (road_x, origin_y))
@@ -341,76 +755,56 @@ class Visualizer:
         origin_y = road_y - road_height//2
         generator_shape = pygame.Rect(origin_x, origin_y, width, road_height)
         pygame.draw.rect(
-            window, self._colors.generator.as_tuple(), generator_shape)
+            window, self._colors.generator, generator_shape)
 
     def _draw_road(self, window, origin_x: int, center_y: int, width: int):
         road_height = self._get_road_height()
         origin_y = center_y - road_height//2
         road_shape = pygame.Rect(origin_x, origin_y, width, road_height)
-        pygame.draw.rect(window, self._colors.road.as_tuple(), road_shape)
-
-    def _draw_car(self, window, origin_x: int, center_y: int, width: int, car_type: str):
-        car_height = self._get_car_height()
-        origin_y = center_y - car_height//2
-        car_shape = pygame.Rect(origin_x, origin_y, width, car_height)
+        window.fill(self._colors.road, road_shape)
+
+    def _get_car_surfaces(self, width: int) -> Dict[str, pygame.Surface]:
+        """Get the cached car surfaces of the given width, by car type."""
+        if width != self._car_surfaces_width:
+            self._car_surfaces = {}
+            self._car_surfaces_width = width
+        return self._car_surfaces
+
+    def _create_car_surface(self, car_type: str) -> pygame.Surface:
+        car_surface = pygame.Surface(
+            (self._car_surfaces_width, self._get_car_height())).convert()
+        car_surface.fill(self._get_car_color(car_type))
+        return car_surface
+
+    def _get_car_color(self, car_type: str) -> Color:
         if car_type == "car":
-            car_color = self._colors.car.as_tuple()
+            car_color = self._colors.car
         elif car_type == "bus":
-            car_color = self._colors.bus.as_tuple()
+            car_color = self._colors.bus
         elif car_type == "firetruck":
-            car_color = self._colors.firetruck.as_tuple()
+            car_color = self._colors.firetruck
         elif car_type == "ambulance":
-            car_color = self._colors.ambulance.as_tuple()
+            car_color = self._colors.ambulance
         elif car_type == "police_cruiser":
-            car_color = self._colors.police_cruiser.as_tuple()
+            car_color = self._colors.police_cruiser
         else:
             raise Exception(car_type + " is not a supported type of vehicle.")
-        pygame.draw.rect(window, car_color, car_shape)
-
-    def _draw_traffic_light(
-        self, window, center_x: int, road_center_y: int,
-        stop_line_thickness: int, is_green: bool
-    ):
-        color = (self._colors.traffic_light_green.as_tuple() if is_green
-            else self._colors.traffic_light_red.as_tuple())
-        road_height = self._get_road_height()
-        light_offset = self._get_light_offset()
-        line_top_y = road_center_y - road_height//2
-        line_bottom_y = road_center_y + road_height//2 + light_offset
-        pygame.draw.line(
-            window, color, (center_x, line_top_y), (center_x, line_bottom_y),
-            stop_line_thickness
-        )
-        radius = self._get_light_radius()
-        center_y = road_center_y + road_height//2 + light_offset + radius
-        pygame.draw.circle(window, color, (center_x, center_y), radius)
+        return car_color
 
     def _draw_indicators(
-        self, window, light_x: int, road_y: int, deceleration_distance: int,
-        stopping_distance: int
+        self, window, deceleration_rects, stopping_full_rects,
+        stopping_half_rects
     ):
-        origin_y = road_y - self._get_road_height()//2
-        pygame.draw.rect(
-            window, self._colors.deceleration_range.as_tuple(),
-            pygame.Rect(
-                light_x - deceleration_distance, origin_y,
-                deceleration_distance, self._get_road_height()
-            )
-        )
-        pygame.draw.rect(
-            window, self._colors.stopping_range_full.as_tuple(),
-            pygame.Rect(
-                light_x - stopping_distance, origin_y,
-                stopping_distance, self._get_road_height()
-            )
-        )
-        pygame.draw.rect(
-            window, self._colors.stopping_range_half.as_tuple(),
-            pygame.Rect(
-                light_x - stopping_distance//2, origin_y,
-                stopping_distance//2, self._get_road_height()
-            )
-        )
+        fill = window.fill
+        color = self._colors.deceleration_range
+        for rect in deceleration_rects:
+            fill(color, rect)
+        color = self._colors.stopping_range_full
+        for rect in stopping_full_rects:
+            fill(color, rect)
+        color = self._colors.stopping_range_half
+        for rect in stopping_half_rects:
+            fill(color, rect)
 
     def _get_canvas_origin(self) -> Tuple[int, int]:
         return (self._get_canvas_origin_left(), self._get_canvas_origin_top())
@@ -433,6 +827,10 @@ class Visualizer:
     def _get_canvas_margin(self) -> int:
         return self._canvas_margin
 
+    def _get_road_y(self, road_idx: int, road_count: int) -> int:
+        road_y_offset = (road_idx+1) * self._get_canvas_height() / (road_count+1)
+        return self._get_canvas_origin_top() + int(road_y_offset)
+
     def _get_road_height(self) -> int:
         return self._road_height
 
@@ -457,6 +855,18 @@ class Visualizer:
     def _get_font_size(self) -> int:
         return self._font_size
 
+    def _get_font(self) -> pygame.font.Font:
+        if self._font is None:
+            self._font = pygame.font.SysFont(
+                self._font_family, self._get_font_size())
+        return self._font
+
+    def _get_road_name_font(self) -> pygame.font.Font:
+        if self._road_name_font is None:
+            self._road_name_font = pygame.font.SysFont(
+                self._font_family, int(.8*self._get_font_size()), italic=True)
+        return self._road_name_font
+
 
 if __name__ == '__main__':
     main()
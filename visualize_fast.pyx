@@ -0,0 +1,46 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+#
+# Traffic Simulation Visualizer
+# Copyright (C) 2022 jonatcln
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+"""Compiled versions of the rendering hot loops of visualize.py.
+
+This module is optional, visualize.py falls back to its pure Python versions
+if it isn't built. Build it in place with `cythonize -i visualize_fast.pyx`.
+"""
+
+
+cpdef list car_blit_sequence(
+    const int[::1] cars_x, list cars_type, dict car_surfaces,
+    object create_car_surface, int car_y
+):
+    """Get the (surface, position) pairs to blit the cars of a road.
+
+    Car surfaces missing from car_surfaces are created with
+    create_car_surface and added to it.
+    """
+    cdef Py_ssize_t i
+    cdef Py_ssize_t car_count = cars_x.shape[0]
+    cdef list blit_sequence = [None] * car_count
+    for i in range(car_count):
+        car_type = cars_type[i]
+        car_surface = car_surfaces.get(car_type)
+        if car_surface is None:
+            car_surface = create_car_surface(car_type)
+            car_surfaces[car_type] = car_surface
+        blit_sequence[i] = (car_surface, (cars_x[i], car_y))
+    return blit_sequence